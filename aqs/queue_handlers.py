@@ -1,7 +1,8 @@
 from azure.storage.queue import QueueClient
 from db.handlers import Post
+from db.fingerprint import fingerprint_post
 import json, os
-from typing import Callable
+from typing import Callable, Optional
 from dotenv import load_dotenv
 from azure.core.exceptions import ResourceExistsError
 
@@ -23,14 +24,21 @@ def ensure_queue_exists(conn_str: str, queue_name: str) -> QueueClient:
     return queue_client
 
 
-def enqueue_post(queue_client, model, url, payload, hash):
+def enqueue_post(queue_client, model, url, payload, run_id: Optional[str] = None):
+    # Only summary-relevant content is hashed, so score/comment-count churn doesn't re-enqueue
+    hash = fingerprint_post(payload)
     # Upsert in MongoDB
     enque = model.upsert_post(url, payload, hash)
     
-    # Push a message to Azure Queue
+    # Push a message to Azure Queue; the sent message (or None) lets callers track it by id,
+    # and run_id lets the consumer tell this run's messages from leftovers of earlier runs
     if enque:
-        queue_client.send_message(json.dumps({"url": url, "hash": hash, "payload": payload}))
-    
+        message = {"url": url, "hash": hash, "payload": payload}
+        if run_id:
+            message["run_id"] = run_id
+        return queue_client.send_message(json.dumps(message))
+    return None
+
     
 def consume_messages(queue_client, callback: Callable[[Post], None], batch_size: int = 10):
     """
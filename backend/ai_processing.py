@@ -3,12 +3,13 @@ import requests
 from dotenv import load_dotenv
 import json
 import logging
-import time
 from azure.storage.queue import QueueClient
 from db.handlers import SummarizedPost, CompanyMetadata
-import hashlib
+from db.fingerprint import fingerprint_post
+from backend.groq_quota import GroqQuotaController
 import re
-from typing import Tuple
+from typing import Callable, Optional, Tuple
+import threading
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -19,6 +20,10 @@ load_dotenv()
 logging.info("Loaded environment variables from .env")
 
 GROQ_API_KEY = os.getenv("GROQ_TOKEN")
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "30"))
+EXPECTED_COMPLETION_TOKENS = 500  # typical summary length, used to pace calls before usage is known
+MAX_DEQUEUE_COUNT = 5  # give up on a message after this many failed attempts
+groq_quota = GroqQuotaController()
 RAW_REDDIT_DATA_FILE = "reddit_data.json"
 if not GROQ_API_KEY:
     logging.error("GROQ_TOKEN not found in environment variables.")
@@ -97,13 +102,16 @@ def extract_interview_summary_with_comments(post_data):
         "temperature": 0.2
     }
     logging.info("Sending request to Groq API for interview summary extraction with comments this test LIT.")
+    # ~4 characters per token is close enough for pacing; the response reports real usage
+    estimated_tokens = len(prompt) // 4 + EXPECTED_COMPLETION_TOKENS
+    response = groq_quota.call(lambda: requests.post(url, headers=headers, data=json.dumps(payload), timeout=GROQ_TIMEOUT), estimated_tokens)
+    if response is None:
+        return None
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
         logging.info("Received response from Groq API.")
         return response.json()["choices"][0]["message"]["content"]
-    except requests.RequestException as e:
-        logging.error(f"Groq API request failed: {e}")
+    except (ValueError, KeyError, IndexError) as e:
+        logging.error(f"Unexpected Groq API response: {e}")
         return None
 
 
@@ -113,15 +121,21 @@ def summarize_post_with_comments(post_data: dict):
     
     Args:
         post_data: Dictionary containing post data including title, selftext, comments, url, etc.
+
+    Returns:
+        False if the Groq call failed and the post should be retried later, True otherwise
     """
     logging.info("Summarizing a Reddit post with comments.")
     
     # Use the new comment-aware extraction function
     summary = extract_interview_summary_with_comments(post_data)
+    if summary is None:
+        logging.warning("Summary request failed, leaving post for a later retry.")
+        return False
     
-    if summary and re.search(r"Summary:\s*None\s*(?:\n|$)", summary, re.IGNORECASE) or re.search(r"None", summary, re.IGNORECASE):
+    if re.search(r"Summary:\s*None\s*(?:\n|$)", summary, re.IGNORECASE) or re.search(r"None", summary, re.IGNORECASE):
         logging.warning("No summary returned for post.")
-        return 
+        return True
     
     # Create entry with all relevant post data
     raw_post = post_data.get("title", "") + "\n\n" + post_data.get("selftext", "")
@@ -138,20 +152,80 @@ def summarize_post_with_comments(post_data: dict):
     }
     company, role = extract_company_and_role(summary)    
     CompanyMetadata.upsert_metadata(company, role)
-    SummarizedPost.upsert_post(entry["url"], summary, raw_post, hashlib.sha256(json.dumps(entry, sort_keys=True).encode("utf-8")).hexdigest(), role, company, entry["timestamp"])
+    SummarizedPost.upsert_post(entry["url"], summary, raw_post, fingerprint_post(post_data), role, company, entry["timestamp"])
+    return True
+
+def create_summaries_for_all_posts(queue_client: QueueClient, producer_done: Optional[threading.Event] = None,
+                                   on_message_done: Optional[Callable[[str], None]] = None,
+                                   run_id: Optional[str] = None,
+                                   batch_size: int = 1, poll_interval: float = 2.0,
+                                   visibility_timeout: Optional[int] = None):
+    """
+    Drains the queue and summarizes each post as soon as it is received.
 
-def create_summaries_for_all_posts(queue_client: QueueClient):
+    Args:
+        queue_client: Azure QueueClient instance
+        producer_done: Set by the ingest pipeline once every post has been enqueued. While it is
+            unset, an empty queue means the fetcher is still running, so we wait instead of returning.
+        on_message_done: Called with each message id once handled so the producer can release back-pressure
+        run_id: When given, on_message_done is only called for messages enqueued with this run id
+        batch_size: Number of messages to pull per request. Every message in a page is hidden from
+            the moment the page is received, so larger pages need a longer visibility_timeout.
+        poll_interval: Seconds to wait between polls of an empty queue
+        visibility_timeout: Seconds a received message stays hidden. Defaults to the longest time
+            groq_quota can spend on a page, so a message is not redelivered (and paid for twice)
+            while it is still being worked on.
+    """
     logging.info(f"Dequeuing Reddit Posts.")
-    posts = queue_client.receive_messages()
-    posts = list(posts)
-    for post in posts:
-        post_data = json.loads(post.content)
-        # logging.info('erer', post_data)
-        logging.info(f"Processing post: {post}")
-        # Use the new comment-aware summarization function
-        summarize_post_with_comments(post_data["payload"])
-        time.sleep(4)  # Sleep to avoid hitting API rate limits
-        queue_client.delete_message(post)
+    if visibility_timeout is None:
+        visibility_timeout = int(batch_size * groq_quota.max_call_seconds(GROQ_TIMEOUT))
+    groq_quota.reset_stats()
+    processed = failed = dropped = 0
+    while True:
+        received = False
+        # Messages are pulled one page at a time instead of materialising the whole queue
+        for post in queue_client.receive_messages(messages_per_page=batch_size, visibility_timeout=visibility_timeout):
+            received = True
+            message_run_id = None
+            try:
+                post_data = json.loads(post.content)
+                message_run_id = post_data.get("run_id")
+                logging.info(f"Processing post: {post}")
+                # Use the new comment-aware summarization function; pacing is handled by groq_quota
+                if summarize_post_with_comments(post_data["payload"]):
+                    queue_client.delete_message(post)
+                    processed += 1
+                elif post.dequeue_count >= MAX_DEQUEUE_COUNT:
+                    logging.error(f"Giving up on post after {post.dequeue_count} attempts: {post_data.get('url')}")
+                    queue_client.delete_message(post)
+                    dropped += 1
+                else:
+                    # Left on the queue; it becomes visible again once the timeout lapses
+                    failed += 1
+            except Exception as e:
+                logging.error(f"Error processing message: {e}")
+                if post.dequeue_count >= MAX_DEQUEUE_COUNT:
+                    # A message that keeps raising (e.g. malformed content) would otherwise be retried forever
+                    logging.error(f"Giving up on message {post.id} after {post.dequeue_count} attempts.")
+                    try:
+                        queue_client.delete_message(post)
+                        dropped += 1
+                    except Exception as delete_error:
+                        logging.error(f"Error deleting message {post.id}: {delete_error}")
+                        failed += 1
+                else:
+                    # Leave the message on the queue; it becomes visible again once the timeout lapses
+                    failed += 1
+            finally:
+                if on_message_done and (run_id is None or message_run_id == run_id):
+                    on_message_done(post.id)
+        if received:
+            continue
+        if producer_done is None or producer_done.is_set():
+            break
+        producer_done.wait(poll_interval)
+    logging.info(f"Summarization run: {processed} processed, {failed} left for retry, {dropped} dropped.")
+    logging.info(f"Groq quota report: {groq_quota.report()}")
 
 def extract_company_and_role(text: str) -> Tuple[str, str]:
     # Remove bullets, asterisks, and excessive whitespace
@@ -188,6 +262,6 @@ def migrate_old_data():
     
     for post_data in reddit_data:
         company, role = extract_company_and_role(post_data["summary"])
-        SummarizedPost.upsert_post(post_data["url"], post_data["summary"], post_data["raw"], hashlib.sha256(json.dumps(post_data, sort_keys=True).encode("utf-8")).hexdigest(), role, company)
+        SummarizedPost.upsert_post(post_data["url"], post_data["summary"], post_data["raw"], fingerprint_post(post_data), role, company, post_data.get("timestamp", 9999999999))
         CompanyMetadata.upsert_metadata(company, role)
 
@@ -1,20 +1,27 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
 import logging
 import os 
 import re
 import sys
 import time
+import threading
+import zlib
 from collections import defaultdict
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from pymongo import MongoClient
+from bson import ObjectId
 from pydantic import BaseModel, validator, Field
 from typing import Optional
-from middleware.auth import verify_ephemeral_token, make_ephemeral_token, get_token_from_header
+from middleware.auth import verify_ephemeral_token, make_ephemeral_token, get_token_from_header, verify_admin_key
+from db.cold_storage import COLD_COLLECTION, load_content, make_excerpt, search_terms
+from backend.similarity import SimilarityIndex
+from db.bulk import build_export_filter, iter_ndjson, gzip_chunks, NDJSONDecoder, bulk_upsert_summaries, IMPORT_BATCH_SIZE
 from dotenv import load_dotenv
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
@@ -40,8 +47,42 @@ client = MongoClient(os.getenv("COSMODB_CONNSTR"), tls=True)
 db = client["reddit-interview"]
 summarized_collection = db["summarized_posts"]
 companies_metadata_collection = db["company_metadata"]
+content_collection = db[COLD_COLLECTION]
 summarized_collection.create_index([("timestamp", -1)])
 
+similarity_index = SimilarityIndex()
+SIMILARITY_REFRESH_SECONDS = int(os.getenv("SIMILARITY_REFRESH_SECONDS", "300"))
+last_similarity_sync = 0.0
+similarity_sync_running = threading.Lock()  # held while a background sync is in progress
+
+def _sync_similarity_index():
+    global last_similarity_sync
+    try:
+        updated, removed = similarity_index.sync(summarized_collection)
+        if updated or removed:
+            logger.info(f"Similarity index synced: {updated} updated, {removed} removed, {len(similarity_index)} total")
+    except Exception as e:
+        logger.error(f"Similarity index sync failed: {e}")
+    finally:
+        last_similarity_sync = time.time()
+        similarity_sync_running.release()
+
+def refresh_similarity_index(force: bool = False):
+    """
+    Starts a background sync when the index is stale. Never blocks the caller, and at most
+    one sync runs at a time; queries are served from the current index meanwhile.
+    """
+    if not force and time.time() - last_similarity_sync < SIMILARITY_REFRESH_SECONDS:
+        return
+    if not similarity_sync_running.acquire(blocking=False):
+        return
+    threading.Thread(target=_sync_similarity_index, name="similarity-sync", daemon=True).start()
+
+@app.on_event("startup")
+def build_similarity_index():
+    # Catch up in the background so startup isn't blocked on vectorizing new summaries
+    refresh_similarity_index(force=True)
+
 limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
@@ -113,13 +154,21 @@ def search(request: Request, search_request: SearchRequest, token: str = Depends
     sort_direction = -1 if search_request.sort_order == "desc" else 1
 
 
-    # Full-text search in raw + summary
+    # Phrase search in the summary; the raw post only keeps its distinct terms (search_text), so it is
+    # matched when every query term appears in it or the summary. The full raw post is in cold storage,
+    # and raw_post only exists on rows split_cold_storage() hasn't converted yet.
     if search_request.query:
         sanitized_query = sanitize_regex_input(search_request.query)
         filter_query["$or"] = [
             {"raw_post": {"$regex": sanitized_query, "$options": "i"}},
             {"summary": {"$regex": sanitized_query, "$options": "i"}}
         ]
+        terms = search_terms(search_request.query)
+        if terms:
+            filter_query["$or"].append({"$and": [
+                {"$or": [{"search_text": {"$regex": re.escape(term)}}, {"summary": {"$regex": re.escape(term), "$options": "i"}}]}
+                for term in terms
+            ]})
         
     metadata = companies_metadata_collection.find({})
     for entry in metadata:
@@ -141,7 +190,7 @@ def search(request: Request, search_request: SearchRequest, token: str = Depends
     # Count + Pagination
     total = summarized_collection.count_documents(filter_query)
     results = list(
-        summarized_collection.find(filter_query)
+        summarized_collection.find(filter_query, {"search_text": 0, "payload": 0})
         .sort("timestamp", sort_direction)
         .skip((search_request.page - 1) * search_request.limit)
         .limit(search_request.limit)
@@ -150,6 +199,10 @@ def search(request: Request, search_request: SearchRequest, token: str = Depends
     # Convert ObjectId to string
     for r in results:
         r["_id"] = str(r["_id"])
+        # Unmigrated rows still carry the full raw post; only ever return an excerpt
+        raw_post = r.pop("raw_post", None)
+        if not r.get("excerpt"):
+            r["excerpt"] = make_excerpt(raw_post)
         companies.add(r["company"])
         roles.add(r["role"])
 
@@ -162,6 +215,125 @@ def search(request: Request, search_request: SearchRequest, token: str = Depends
         "roles": sorted(roles)
     }
     
+@app.get("/posts/{post_id}")
+@limiter.limit("30/minute")
+def get_post(request: Request, post_id: str, token: str = Depends(get_token_from_header)):
+    """
+    Detail view: the hot search document plus its full raw post and comments from cold storage.
+    """
+    ok, info = verify_ephemeral_token(token)
+    if not ok:
+        raise HTTPException(401, "Invalid or expired token")
+    if not ObjectId.is_valid(post_id):
+        raise HTTPException(400, "Invalid post id")
+    post = summarized_collection.find_one({"_id": ObjectId(post_id)})
+    if not post:
+        raise HTTPException(404, "Post not found")
+
+    content = load_content(content_collection, post["url"])
+    post["_id"] = str(post["_id"])
+    post["raw_post"] = content["raw_post"] or post.get("raw_post") or post.get("excerpt", "")
+    post["comments"] = (content["payload"] or {}).get("comments", [])
+    post.pop("payload", None)
+    post.pop("search_text", None)
+    return post
+
+@app.get("/similar/{post_id}")
+@limiter.limit("30/minute")
+def similar(request: Request, post_id: str, k: int = Query(5, ge=1, le=20), token: str = Depends(get_token_from_header)):
+    """
+    The k interview experiences whose summaries are most similar to the given post.
+    """
+    ok, info = verify_ephemeral_token(token)
+    if not ok:
+        raise HTTPException(401, "Invalid or expired token")
+    if not ObjectId.is_valid(post_id):
+        raise HTTPException(400, "Invalid post id")
+
+    refresh_similarity_index()
+    try:
+        neighbours = similarity_index.most_similar(post_id, k)
+    except KeyError:
+        # Possibly summarized since the last sync: index just this document
+        doc = summarized_collection.find_one({"_id": ObjectId(post_id)}, {"hash": 1, "summary": 1})
+        if not doc:
+            raise HTTPException(404, "Post not found")
+        similarity_index.add(post_id, doc.get("hash"), doc.get("summary", ""))
+        neighbours = similarity_index.most_similar(post_id, k)
+
+    scores = dict(neighbours)
+    docs = summarized_collection.find({"_id": {"$in": [ObjectId(doc_id) for doc_id in scores]}}, {"raw_post": 0, "payload": 0, "search_text": 0})
+    by_id = {str(doc["_id"]): doc for doc in docs}
+    results = []
+    for doc_id, score in neighbours:
+        doc = by_id.get(doc_id)
+        if doc:
+            doc["_id"] = doc_id
+            doc["score"] = round(score, 4)
+            results.append(doc)
+    return {"id": post_id, "results": results}
+
+@app.get("/export")
+@limiter.limit("5/minute")
+def export(request: Request,
+           company: Optional[str] = None,
+           role: Optional[str] = None,
+           since: Optional[int] = None,
+           until: Optional[int] = None,
+           resume_token: Optional[str] = Query(None, max_length=24),
+           compress: bool = False,
+           include_raw: bool = False,
+           token: str = Depends(get_token_from_header)):
+    """
+    Streams every matching summarized post as NDJSON. To resume an interrupted export,
+    pass the "_id" of the last record received as resume_token. include_raw adds the
+    full raw post from cold storage; without it an import can't restore the post detail view.
+    """
+    ok, info = verify_ephemeral_token(token)
+    if not ok:
+        raise HTTPException(401, "Invalid or expired token")
+    try:
+        filter_query = build_export_filter(company, role, since, until, resume_token)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    chunks = iter_ndjson(summarized_collection, filter_query, content_collection=content_collection if include_raw else None)
+    headers = {}
+    if compress:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type="application/x-ndjson", headers=headers)
+
+@app.post("/import", dependencies=[Depends(verify_admin_key)])
+async def import_posts(request: Request):
+    """
+    Bulk-upserts an NDJSON body (as produced by /export) in fixed-size batches.
+    Send "Content-Encoding: gzip" for a compressed body.
+    """
+    decoder = NDJSONDecoder(compressed=request.headers.get("Content-Encoding", "").lower() in ("gzip", "deflate"))
+    totals = {"upserted": 0, "modified": 0, "rejected": 0}
+    batch = []
+
+    async def flush():
+        counts = await run_in_threadpool(bulk_upsert_summaries, summarized_collection, companies_metadata_collection, batch, content_collection)
+        for key in totals:
+            totals[key] += counts[key]
+        batch.clear()
+
+    try:
+        async for chunk in request.stream():
+            batch.extend(decoder.feed(chunk))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await flush()
+        batch.extend(decoder.close())
+    except (ValueError, zlib.error) as e:
+        # json.JSONDecodeError is a ValueError; batches flushed so far stay imported
+        logging.error(f"Import aborted: {type(e).__name__}")
+        raise HTTPException(400, f"Malformed import body after {totals['upserted'] + totals['modified']} records")
+    if batch:
+        await flush()
+    return totals
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))  # fallback to 8000 locally
     uvicorn.run(app, host="0.0.0.0", port=port)
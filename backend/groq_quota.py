@@ -0,0 +1,205 @@
+"""
+Client-side pacing for the Groq API.
+
+Groq reports the remaining request/token budget and when it resets on every
+response (x-ratelimit-* headers, plus retry-after on a 429). The controller keeps
+the latest view of that budget, waits before a call that would overrun it, and
+retries transient failures with jittered exponential backoff.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+import requests
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+REQUESTS_WINDOW_SECONDS = 24 * 3600  # x-ratelimit-limit-requests is requests per day
+TOKENS_WINDOW_SECONDS = 60  # x-ratelimit-limit-tokens is tokens per minute
+TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parses Groq reset durations such as "2m59.56s", "7.66s" or "120ms" into seconds.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def _int_header(headers, name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class GroqQuotaController:
+    def __init__(self, max_retries: int = 4, base_backoff: float = 2.0, max_backoff: float = 60.0):
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+
+        # Latest budget reported by Groq; None until the first response arrives
+        self.limit_requests: Optional[int] = None
+        self.remaining_requests: Optional[int] = None
+        self.requests_reset_at = 0.0
+        self.limit_tokens: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.tokens_reset_at = 0.0
+        self.blocked_until = 0.0
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Starts a new reporting period. The known quota budget is kept.
+        """
+        self.started = time.monotonic()
+        self.stats = {
+            "requests": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "tokens_used": 0,
+            "seconds_waited": 0.0,
+        }
+
+    def update_from_headers(self, headers):
+        now = time.monotonic()
+        with self.lock:
+            self.limit_requests = _int_header(headers, "x-ratelimit-limit-requests") or self.limit_requests
+            self.limit_tokens = _int_header(headers, "x-ratelimit-limit-tokens") or self.limit_tokens
+
+            remaining = _int_header(headers, "x-ratelimit-remaining-requests")
+            if remaining is not None:
+                self.remaining_requests = remaining
+                self.requests_reset_at = now + (parse_duration(headers.get("x-ratelimit-reset-requests")) or 0)
+            remaining = _int_header(headers, "x-ratelimit-remaining-tokens")
+            if remaining is not None:
+                self.remaining_tokens = remaining
+                self.tokens_reset_at = now + (parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0)
+
+            retry_after = parse_duration(headers.get("retry-after"))
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def _delay_needed(self, estimated_tokens: int) -> float:
+        now = time.monotonic()
+        with self.lock:
+            delay = self.blocked_until - now
+            if self.remaining_requests is not None and self.remaining_requests < 1:
+                delay = max(delay, self.requests_reset_at - now)
+            if self.remaining_tokens is not None and self.remaining_tokens < estimated_tokens:
+                delay = max(delay, self.tokens_reset_at - now)
+            return max(0.0, delay)
+
+    def wait_for_capacity(self, estimated_tokens: int):
+        """
+        Blocks until the last reported budget has room for a call of roughly estimated_tokens.
+        """
+        delay = self._delay_needed(estimated_tokens)
+        if delay > 0:
+            logging.info(f"Pacing Groq calls: waiting {delay:.1f}s for quota to reset.")
+            time.sleep(delay)
+            self.stats["seconds_waited"] += delay
+        with self.lock:
+            # Spend the budget locally until the next response tells us the real numbers
+            if self.remaining_requests is not None:
+                self.remaining_requests -= 1
+            if self.remaining_tokens is not None:
+                self.remaining_tokens -= estimated_tokens
+
+    def _backoff(self, attempt: int):
+        # Full jitter keeps concurrent clients from retrying in lockstep
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+        self.stats["retries"] += 1
+        self.stats["seconds_waited"] += delay
+        time.sleep(delay)
+
+    def max_call_seconds(self, request_timeout: float) -> float:
+        """
+        Upper bound on how long call() takes while the daily request quota lasts: every attempt
+        waits out a token-window reset and then times out, with the longest backoff in between.
+        """
+        attempts = self.max_retries + 1
+        return attempts * (TOKENS_WINDOW_SECONDS + request_timeout) + self.max_retries * self.max_backoff
+
+    def call(self, send: Callable[[], requests.Response], estimated_tokens: int) -> Optional[requests.Response]:
+        """
+        Sends a request through the controller.
+
+        Args:
+            send: Performs the HTTP call and returns the response
+            estimated_tokens: Rough prompt + completion size, used for pacing before the real usage is known
+
+        Returns:
+            The successful response, or None once retries are exhausted or the error is not transient
+        """
+        for attempt in range(self.max_retries + 1):
+            self.wait_for_capacity(estimated_tokens)
+            self.stats["requests"] += 1
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                logging.warning(f"Groq API request failed (attempt {attempt + 1}): {e}")
+                if attempt < self.max_retries:
+                    self._backoff(attempt)
+                continue
+            except requests.RequestException as e:
+                logging.error(f"Groq API request failed: {e}")
+                break
+
+            self.update_from_headers(response.headers)
+            if response.status_code == 429:
+                self.stats["rate_limited"] += 1
+                logging.warning(f"Groq API rate limited (attempt {attempt + 1}).")
+                if not parse_duration(response.headers.get("retry-after")) and attempt < self.max_retries:
+                    self._backoff(attempt)
+                continue
+            if response.status_code in TRANSIENT_STATUS_CODES:
+                logging.warning(f"Groq API returned {response.status_code} (attempt {attempt + 1}).")
+                if attempt < self.max_retries:
+                    self._backoff(attempt)
+                continue
+            if not response.ok:
+                logging.error(f"Groq API request failed: {response.status_code} {response.text[:200]}")
+                break
+
+            self.stats["succeeded"] += 1
+            try:
+                self.stats["tokens_used"] += response.json().get("usage", {}).get("total_tokens", estimated_tokens)
+            except ValueError:
+                self.stats["tokens_used"] += estimated_tokens
+            return response
+
+        self.stats["failed"] += 1
+        return None
+
+    def report(self) -> dict:
+        """
+        Run statistics, including the share of the request and token quotas actually used
+        over the time the controller has been running.
+        """
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        report = dict(self.stats, elapsed_seconds=round(elapsed, 1))
+        report["seconds_waited"] = round(report["seconds_waited"], 1)
+        if self.limit_tokens:
+            report["token_quota_share"] = round(self.stats["tokens_used"] / (self.limit_tokens * elapsed / TOKENS_WINDOW_SECONDS), 3)
+        if self.limit_requests:
+            report["request_quota_share"] = round(self.stats["requests"] / (self.limit_requests * elapsed / REQUESTS_WINDOW_SECONDS), 3)
+        return report
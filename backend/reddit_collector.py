@@ -5,11 +5,15 @@ import re
 import json 
 from collections import Counter
 from backend.ai_processing import create_summaries_for_all_posts
-import hashlib
 from aqs.queue_handlers import enqueue_post, ensure_queue_exists
-from db.handlers import Post, SummarizedPost
+from db.handlers import Post, SummarizedPost, PostContent
+from db.cold_storage import store_content, load_content, make_excerpt, make_search_text
+from db.fingerprint import fingerprint_post
 import logging
 from urllib.parse import urlparse
+import queue
+import threading
+import uuid
 
 load_dotenv()
 
@@ -63,6 +67,11 @@ QUERIES = [
     '(title:"interview" OR title:"experience") AND title:(oa OR onsite OR final OR phone OR screening)',
 ]
 
+# Posts fetched but not yet triaged, and posts enqueued but not yet summarized
+FETCH_BUFFER_SIZE = int(os.getenv("FETCH_BUFFER_SIZE", "25"))
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "50"))
+_FETCH_DONE = object()
+
 
 def get_reddit_instance():
     return praw.Reddit(
@@ -81,10 +90,11 @@ def score_post(text):
     total_matches = len(flat_matches)  # total number of matches including duplicates
     return score, total_matches
 
-def fetch_and_store_posts(time_filter):
-    reddit = get_reddit_instance()
-    queue_client = ensure_queue_exists(os.getenv("AZURE_QUEUE_CONN"), "reddit-posts")
-    all_data = []
+def iter_posts(reddit, time_filter):
+    """
+    Lazily yields one post dict (with its top 3 comments) at a time so a crawl never
+    has to be held in memory.
+    """
     for subreddit_name in SUBREDDITS:
         subreddit = reddit.subreddit(subreddit_name)
         for query in QUERIES:
@@ -119,11 +129,146 @@ def fetch_and_store_posts(time_filter):
                     "num_comments": post.num_comments,
                     "comments": comments_data
                 }
-                all_data.append(post_data)
                 logging.info(f"Fetched post: {post.title} with {len(comments_data)} comments")
-                enqueue_post(queue_client, Post, post.url, post_data, hashlib.sha256(json.dumps(post_data, sort_keys=True).encode("utf-8")).hexdigest())
-    create_summaries_for_all_posts(queue_client)
+                yield post_data
+
+
+class InFlightGate:
+    """
+    Caps the number of messages this run has enqueued but not yet summarized, so the
+    fetcher blocks instead of running arbitrarily far ahead of the summarizer.
+
+    Slots are tied to message ids, and only this run's messages are released (see run_id
+    in enqueue_post). The cap only applies once the summarizer has reached this run's
+    messages: while it is still draining an earlier backlog the crawl is not held back,
+    so posts from a short time window are enqueued before the run times out.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.owned = set()
+        self.done_early = set()  # handled before the producer registered them
+        self.caught_up = False
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.caught_up and self.in_flight >= self.limit and not self.closed:
+                self.cond.wait()
+            self.in_flight += 1
 
+    def _free(self):
+        self.in_flight -= 1
+        self.cond.notify()
+
+    def cancel(self):
+        # The acquired slot was not used (post unchanged or enqueue failed)
+        with self.cond:
+            self._free()
+
+    def register(self, msg_id: str):
+        with self.cond:
+            if msg_id in self.done_early:
+                self.done_early.discard(msg_id)
+                self._free()
+            else:
+                self.owned.add(msg_id)
+
+    def release(self, msg_id: str):
+        with self.cond:
+            self.caught_up = True
+            if msg_id in self.owned:
+                self.owned.discard(msg_id)
+                self._free()
+            else:
+                self.done_early.add(msg_id)
+
+    def close(self):
+        # Once the summarizer stops nothing will release slots, so stop blocking the fetcher
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+def _put(buffer: queue.Queue, item, stop: threading.Event) -> bool:
+    # Blocks while the buffer is full, but gives up once the pipeline is stopping
+    while not stop.is_set():
+        try:
+            buffer.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _fetch_into(buffer: queue.Queue, reddit, time_filter, stop: threading.Event):
+    try:
+        for post_data in iter_posts(reddit, time_filter):
+            if not _put(buffer, post_data, stop):
+                return
+    except Exception as e:
+        logging.error(f"Fetching posts failed: {e}")
+    finally:
+        _put(buffer, _FETCH_DONE, stop)
+
+
+def _summarize_from(queue_client, producer_done: threading.Event, gate: InFlightGate, run_id: str):
+    try:
+        create_summaries_for_all_posts(queue_client, producer_done=producer_done, on_message_done=gate.release, run_id=run_id)
+    except Exception as e:
+        logging.error(f"Summarizing posts failed: {e}")
+    finally:
+        gate.close()
+
+
+def fetch_and_store_posts(time_filter):
+    """
+    Runs the ingest job as a streaming pipeline:
+
+        fetch (thread) -> bounded buffer -> triage + enqueue -> Azure queue -> summarize (thread)
+
+    All stages run concurrently. The bounded buffer and the in-flight gate provide back-pressure,
+    so memory stays constant in the size of the crawl and the run takes about as long as the
+    slower of fetching and summarizing.
+    """
+    reddit = get_reddit_instance()
+    queue_client = ensure_queue_exists(os.getenv("AZURE_QUEUE_CONN"), "reddit-posts")
+    buffer = queue.Queue(maxsize=FETCH_BUFFER_SIZE)
+    gate = InFlightGate(MAX_IN_FLIGHT)
+    producer_done = threading.Event()
+    stop = threading.Event()
+    run_id = uuid.uuid4().hex
+
+    fetcher = threading.Thread(target=_fetch_into, args=(buffer, reddit, time_filter, stop), name="reddit-fetcher", daemon=True)
+    summarizer = threading.Thread(target=_summarize_from, args=(queue_client, producer_done, gate, run_id), name="summarizer", daemon=True)
+    fetcher.start()
+    summarizer.start()
+
+    try:
+        while True:
+            post_data = buffer.get()
+            if post_data is _FETCH_DONE:
+                break
+            gate.acquire()
+            try:
+                # Triage: upsert_post only asks for a summary when the post is new or its content changed
+                message = enqueue_post(queue_client, Post, post_data["url"], post_data, run_id)
+            except Exception as e:
+                # One failed post shouldn't abort the crawl; it is picked up again on the next run
+                logging.error(f"Enqueueing post failed: {post_data.get('url')}: {e}")
+                message = None
+            if message:
+                gate.register(message.id)
+            else:
+                gate.cancel()
+    finally:
+        # Unblock the fetcher if we stopped early, then wait for both stages so no thread outlives the run
+        stop.set()
+        producer_done.set()
+        fetcher.join()
+        summarizer.join()
 
 
 def is_reddit_submission_url(url: str) -> bool:
@@ -158,22 +303,26 @@ def remove_deleted_posts():
         url = doc.url
         if not is_reddit_submission_url(url):
             doc.delete()
+            PostContent.discard_summary_content(url)
             logging.info(f"SummarizedPost deleted: {url} due to invalid url, removed from DB.")
             continue
         post = reddit.submission(url=url)
         if post.selftext == '[deleted]' or post.title == '[deleted]':
             doc.delete()
+            PostContent.discard_summary_content(url)
             logging.info(f"SummarizedPost deleted: {url}, removed from DB.")
     
     for doc in all_posts:
         url = doc.url
         if not is_reddit_submission_url(url):
             doc.delete()
+            PostContent.objects(url=url).delete()
             logging.info(f"Post deleted: {url} due to invalid url, removed from DB.")
             continue
         post = reddit.submission(url=url)
         if post.selftext == '[deleted]' or post.title == '[deleted]':
             Post.objects(url=url).delete()
+            PostContent.objects(url=url).delete()
             logging.info(f"Post deleted: {url}, removed from DB.")
 
 def remove_none_posts(): 
@@ -181,8 +330,79 @@ def remove_none_posts():
     for doc in all_summarized_posts:
         if re.search(r"None", doc.summary, re.IGNORECASE):
             doc.delete()
+            PostContent.discard_summary_content(doc.url)
             logging.info(f"SummarizedPost deleted: {doc.url} due to 'None', removed from DB.")
 
+def rehash_fingerprints():
+    """
+    One-off migration: recompute stored hashes with the current content fingerprint so that
+    existing posts are not re-summarized just because the hashing scheme changed.
+    """
+    updated = 0
+    for doc in Post.objects().no_cache():
+        new_hash = fingerprint_post(doc.payload or {"url": doc.url})
+        if doc.hash != new_hash:
+            Post.objects(id=doc.id).update_one(set__hash=new_hash)
+            updated += 1
+    logging.info(f"Rehashed {updated} posts.")
+
+    updated = 0
+    for doc in SummarizedPost.objects().no_cache():
+        # Prefer the source post, which still has the comments the summary was built from
+        source = Post.objects(url=doc.url).first()
+        # payload is read from cold storage on each access
+        payload = source.payload if source else None
+        if payload:
+            new_hash = fingerprint_post(payload)
+        else:
+            new_hash = fingerprint_post({"url": doc.url, "raw": doc.raw_post})
+        if doc.hash != new_hash:
+            SummarizedPost.objects(id=doc.id).update_one(set__hash=new_hash)
+            updated += 1
+    logging.info(f"Rehashed {updated} summarized posts.")
+
+
+def split_cold_storage(batch_size: int = 100):
+    """
+    One-off migration to the hot/cold layout: moves Post.payload and SummarizedPost.raw_post/payload
+    into the compressed post_content collection, adds the excerpt and search text and unsets the bulky fields.
+    Safe to re-run; rows that were already moved are skipped, but every search text is rebuilt so a
+    change to its format is picked up.
+    """
+    cold = PostContent._get_collection()
+
+    posts = Post._get_collection()
+    moved = 0
+    for doc in posts.find({"payload": {"$exists": True}}, {"url": 1, "payload": 1}, batch_size=batch_size):
+        store_content(cold, doc["url"], payload=doc["payload"])
+        posts.update_one({"_id": doc["_id"]}, {"$unset": {"payload": ""}})
+        moved += 1
+    logging.info(f"Moved {moved} post payloads to cold storage.")
+
+    summaries = SummarizedPost._get_collection()
+    moved = 0
+    query = {"$or": [{"raw_post": {"$exists": True}}, {"payload": {"$exists": True}}]}
+    for doc in summaries.find(query, {"url": 1, "summary": 1, "raw_post": 1, "payload": 1}, batch_size=batch_size):
+        raw_post = doc.get("raw_post")
+        # Don't overwrite the ingest payload that Post already moved for this url
+        payload = doc.get("payload") if doc.get("payload") and not cold.find_one({"url": doc["url"], "payload": {"$exists": True}}, {"_id": 1}) else None
+        store_content(cold, doc["url"], raw_post=raw_post, payload=payload)
+        update = {"$unset": {"raw_post": "", "payload": ""}}
+        if raw_post is not None:
+            update["$set"] = {"excerpt": make_excerpt(raw_post), "search_text": make_search_text(raw_post, doc.get("summary"))}
+        summaries.update_one({"_id": doc["_id"]}, update)
+        moved += 1
+    logging.info(f"Moved {moved} summarized posts to cold storage.")
+
+    # Rebuild the search text of rows converted earlier from cold storage
+    rebuilt = 0
+    for doc in summaries.find({}, {"url": 1, "summary": 1}, batch_size=batch_size):
+        raw_post = load_content(cold, doc["url"])["raw_post"]
+        if raw_post is not None:
+            summaries.update_one({"_id": doc["_id"]}, {"$set": {"excerpt": make_excerpt(raw_post), "search_text": make_search_text(raw_post, doc.get("summary"))}})
+            rebuilt += 1
+    logging.info(f"Rebuilt search text for {rebuilt} summarized posts.")
+
 
 if __name__ == "__main__":
     remove_none_posts()
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""
+Local "similar interviews" index.
+
+Each SummarizedPost summary is turned into a signed hashed-feature vector (sublinear
+term frequency over unigrams and bigrams, L2-normalized), so no vocabulary has to be
+fitted or stored and the index can grow one document at a time. Vectors live in a
+float32 matrix memory-mapped from disk and neighbours are found with blocked
+cosine similarity on the CPU.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+SIMILARITY_INDEX_DIR = os.getenv("SIMILARITY_INDEX_DIR", ".similarity_index")
+SIMILARITY_DIM = int(os.getenv("SIMILARITY_DIM", "2048"))
+INDEX_VERSION = 1
+INITIAL_CAPACITY = 1024
+QUERY_BLOCK_ROWS = 8192  # rows scored per matmul, bounds scratch memory during a query
+SYNC_FETCH_BATCH = 500
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*")
+# Common English words plus the labels every summary shares ("Company:", "Role:", "Summary:")
+STOPWORDS = frozenset("""
+a an and are as at be been but by for from had has have he her his i if in into is it its me my no not
+of on or our she so than that the their them then there they this to up was we were what when which who
+will with you your also about after all any can did do just more other out some very would could
+company role summary interview experience unknown
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def vectorize(text: str, dim: int = SIMILARITY_DIM) -> np.ndarray:
+    """
+    Hashes unigrams and bigrams into a dim-sized, L2-normalized float32 vector.
+    """
+    tokens = tokenize(text)
+    features = Counter(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+
+    vec = np.zeros(dim, dtype=np.float32)
+    for feature, count in features.items():
+        # crc32 is stable across processes, unlike hash()
+        h = zlib.crc32(feature.encode("utf-8"))
+        sign = 1.0 if h & 0x80000000 else -1.0
+        vec[h % dim] += sign * (1.0 + np.log(count))
+    norm = np.linalg.norm(vec)
+    if norm > 0:
+        vec /= norm
+    return vec
+
+
+class SimilarityIndex:
+    """
+    Append-mostly matrix of summary vectors, persisted as:
+
+        vectors.f32  raw float32 rows, memory-mapped
+        rows.json    index metadata and, per row, the document id and the hash it was built from
+    """
+
+    def __init__(self, path: str = SIMILARITY_INDEX_DIR, dim: int = SIMILARITY_DIM):
+        self.path = path
+        self.dim = dim
+        self.lock = threading.RLock()
+        self.ids: List[Optional[str]] = []
+        self.hashes: List[Optional[str]] = []
+        self.row_of: Dict[str, int] = {}
+        self.free_rows: List[int] = []
+        self.capacity = 0
+        self.matrix: Optional[np.memmap] = None
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def rows_path(self) -> str:
+        return os.path.join(self.path, "rows.json")
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    def _load(self):
+        meta = None
+        if os.path.exists(self.rows_path) and os.path.exists(self.vectors_path):
+            with open(self.rows_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        if not meta or meta.get("version") != INDEX_VERSION or meta.get("dim") != self.dim:
+            if meta:
+                logging.info("Similarity index format changed, rebuilding from scratch.")
+            self._resize(INITIAL_CAPACITY, fresh=True)
+            return
+
+        self.ids = meta["ids"]
+        self.hashes = meta["hashes"]
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids) if doc_id is not None}
+        self.free_rows = [row for row, doc_id in enumerate(self.ids) if doc_id is None]
+        self.capacity = meta["capacity"]
+        self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+    def _resize(self, capacity: int, fresh: bool = False):
+        if self.matrix is not None:
+            self.matrix.flush()
+            del self.matrix
+        mode = "w+" if fresh else "r+"
+        if not fresh:
+            # Grow the file in place; new rows read back as zeros
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(capacity * self.dim * 4)
+        self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode=mode, shape=(capacity, self.dim))
+        if fresh:
+            self.ids, self.hashes, self.row_of, self.free_rows = [], [], {}, []
+        self.capacity = capacity
+
+    def flush(self):
+        with self.lock:
+            self.matrix.flush()
+            tmp_path = self.rows_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "version": INDEX_VERSION,
+                    "dim": self.dim,
+                    "capacity": self.capacity,
+                    "ids": self.ids,
+                    "hashes": self.hashes,
+                }, f)
+            os.replace(tmp_path, self.rows_path)
+
+    def add(self, doc_id: str, doc_hash: str, text: str):
+        """
+        Inserts or replaces the vector for a document. Call flush() to persist the row mapping.
+        """
+        vec = vectorize(text, self.dim)
+        with self.lock:
+            row = self.row_of.get(doc_id)
+            if row is None:
+                if self.free_rows:
+                    row = self.free_rows.pop()
+                else:
+                    row = len(self.ids)
+                    if row >= self.capacity:
+                        self._resize(self.capacity * 2)
+                    self.ids.append(None)
+                    self.hashes.append(None)
+                self.row_of[doc_id] = row
+                self.ids[row] = doc_id
+            self.hashes[row] = doc_hash
+            self.matrix[row] = vec
+
+    def remove(self, doc_id: str):
+        with self.lock:
+            row = self.row_of.pop(doc_id, None)
+            if row is None:
+                return
+            self.matrix[row] = 0.0  # a zero row can never score above a real neighbour
+            self.ids[row] = None
+            self.hashes[row] = None
+            self.free_rows.append(row)
+
+    def sync(self, collection) -> Tuple[int, int]:
+        """
+        Incrementally brings the index in line with summarized_posts: only documents that are
+        new or whose hash changed are re-vectorized, and deleted ones are dropped.
+
+        Returns:
+            (number of documents added or updated, number removed)
+        """
+        # The Mongo scan and vectorizing happen outside the lock so queries keep being served;
+        # the lock is only taken to snapshot the row hashes and to apply each change.
+        with self.lock:
+            indexed = {doc_id: self.hashes[row] for doc_id, row in self.row_of.items()}
+
+        seen = set()
+        stale = []
+        for doc in collection.find({}, {"_id": 1, "hash": 1}, batch_size=SYNC_FETCH_BATCH):
+            doc_id = str(doc["_id"])
+            seen.add(doc_id)
+            if doc_id not in indexed or indexed[doc_id] != doc.get("hash"):
+                stale.append(doc["_id"])
+
+        for start in range(0, len(stale), SYNC_FETCH_BATCH):
+            batch = stale[start:start + SYNC_FETCH_BATCH]
+            for doc in collection.find({"_id": {"$in": batch}}, {"_id": 1, "hash": 1, "summary": 1}):
+                self.add(str(doc["_id"]), doc.get("hash"), doc.get("summary", ""))
+
+        # Only drop rows that were indexed when the scan started; anything added since is newer than the scan
+        removed = [doc_id for doc_id in indexed if doc_id not in seen]
+        for doc_id in removed:
+            self.remove(doc_id)
+
+        if stale or removed:
+            self.flush()
+        return len(stale), len(removed)
+
+    def most_similar(self, doc_id: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Top-k neighbours of an indexed document by cosine similarity, best first.
+        """
+        with self.lock:
+            row = self.row_of.get(doc_id)
+            if row is None:
+                raise KeyError(doc_id)
+            query = np.array(self.matrix[row])
+            return self.query(query, k, exclude_rows=[row])
+
+    def query(self, vec: np.ndarray, k: int = 10, exclude_rows: Iterable[int] = ()) -> List[Tuple[str, float]]:
+        with self.lock:
+            used = len(self.ids)
+            exclude = set(exclude_rows)
+            best_rows = np.empty(0, dtype=np.int64)
+            best_scores = np.empty(0, dtype=np.float32)
+            for start in range(0, used, QUERY_BLOCK_ROWS):
+                # Rows are unit length, so the dot product is the cosine similarity
+                scores = self.matrix[start:min(start + QUERY_BLOCK_ROWS, used)] @ vec
+                for row in exclude:
+                    if start <= row < start + len(scores):
+                        scores[row - start] = -np.inf
+                rows = np.arange(start, start + len(scores))
+                best_rows = np.concatenate([best_rows, rows])
+                best_scores = np.concatenate([best_scores, scores])
+                if len(best_scores) > k:
+                    keep = np.argpartition(-best_scores, k)[:k]
+                    best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+            order = np.argsort(-best_scores)
+            return [
+                (self.ids[best_rows[i]], float(best_scores[i]))
+                for i in order
+                if self.ids[best_rows[i]] is not None and best_scores[i] > 0
+            ]
@@ -0,0 +1,216 @@
+"""
+Streaming NDJSON export/import for the summarized posts collection.
+
+Everything here works on plain pymongo collections and iterates in fixed-size
+batches, so memory use does not depend on how many documents are exported or imported.
+"""
+import json
+import os
+import zlib
+from typing import Iterable, Iterator, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from db.cold_storage import make_excerpt, make_search_text, pack_content, unpack_content
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+SUMMARY_FIELDS = ("url", "hash", "company", "role", "summary", "excerpt", "search_text", "timestamp")
+REQUIRED_STRING_FIELDS = ("url", "hash", "company", "role", "summary")
+OPTIONAL_STRING_FIELDS = ("excerpt", "search_text", "raw_post")
+
+
+def build_export_filter(company: Optional[str] = None, role: Optional[str] = None,
+                        since: Optional[int] = None, until: Optional[int] = None,
+                        resume_token: Optional[str] = None) -> dict:
+    """
+    Builds the find() filter for an export, mirroring the /search company/role filters.
+
+    Args:
+        company: Only export this company ("all" or None for every company)
+        role: Only export this role ("all" or None for every role)
+        since: Only export posts with timestamp >= since
+        until: Only export posts with timestamp < until
+        resume_token: The "_id" of the last record a previous export delivered
+    """
+    filter_query = {}
+    if company and company != "all":
+        filter_query["company"] = company
+    if role and role != "all":
+        filter_query["role"] = role
+    if since is not None or until is not None:
+        filter_query["timestamp"] = {}
+        if since is not None:
+            filter_query["timestamp"]["$gte"] = since
+        if until is not None:
+            filter_query["timestamp"]["$lt"] = until
+    if resume_token:
+        if not ObjectId.is_valid(resume_token):
+            raise ValueError("Invalid resume token")
+        filter_query["_id"] = {"$gt": ObjectId(resume_token)}
+    return filter_query
+
+
+def _encode_batch(docs: List[dict], content_collection=None) -> bytes:
+    if content_collection is not None:
+        # One cold-storage lookup per batch rather than per document
+        cold = {doc["url"]: doc for doc in content_collection.find({"url": {"$in": [d["url"] for d in docs]}})}
+        for doc in docs:
+            raw_post = unpack_content(cold.get(doc["url"]))["raw_post"]
+            if raw_post is not None:
+                doc["raw_post"] = raw_post
+    lines = []
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+        lines.append(json.dumps(doc, ensure_ascii=False, default=str))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def iter_ndjson(collection, filter_query: dict, batch_size: int = EXPORT_BATCH_SIZE,
+                content_collection=None) -> Iterator[bytes]:
+    """
+    Walks the collection with a server-side cursor in _id order and yields one NDJSON chunk per batch.
+
+    Each record carries its "_id", which doubles as the resume token for the next export, and its
+    search_text, so an import stays searchable without the raw post. When content_collection is
+    given, the full raw post is read back from cold storage.
+    """
+    cursor = collection.find(filter_query, sort=[("_id", 1)], batch_size=batch_size)
+    docs = []
+    try:
+        for doc in cursor:
+            docs.append(doc)
+            if len(docs) >= batch_size:
+                yield _encode_batch(docs, content_collection)
+                docs = []
+        if docs:
+            yield _encode_batch(docs, content_collection)
+    finally:
+        cursor.close()
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Gzip-compresses a stream of chunks incrementally.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class NDJSONDecoder:
+    """
+    Incrementally turns raw (optionally gzip/zlib-compressed) body chunks into records.
+
+    Only the current partial line is buffered between calls to feed().
+    """
+
+    def __init__(self, compressed: bool = False):
+        # wbits=47 auto-detects gzip or zlib headers
+        self.decompressor = zlib.decompressobj(47) if compressed else None
+        self.pending = b""
+
+    def feed(self, chunk: bytes) -> List[dict]:
+        if self.decompressor:
+            chunk = self.decompressor.decompress(chunk)
+        self.pending += chunk
+        *lines, self.pending = self.pending.split(b"\n")
+        return [json.loads(line) for line in lines if line.strip()]
+
+    def close(self) -> List[dict]:
+        if self.decompressor:
+            self.pending += self.decompressor.flush()
+        lines, self.pending = self.pending.split(b"\n"), b""
+        return [json.loads(line) for line in lines if line.strip()]
+
+
+def is_valid_summary_record(record) -> bool:
+    """
+    Checks that a record has the field types the search/export queries rely on:
+    string url/hash/company/role/summary and an integer timestamp.
+    """
+    if not isinstance(record, dict):
+        return False
+    if not all(isinstance(record.get(field), str) for field in REQUIRED_STRING_FIELDS):
+        return False
+    if not all(record.get(field) is None or isinstance(record[field], str) for field in OPTIONAL_STRING_FIELDS):
+        return False
+    timestamp = record.get("timestamp")
+    # bool is an int subclass but never a valid timestamp
+    return isinstance(timestamp, int) and not isinstance(timestamp, bool)
+
+
+def bulk_upsert_summaries(summaries_collection, metadata_collection, records: List[dict],
+                          content_collection=None) -> dict:
+    """
+    Upserts a batch of exported summarized posts keyed on url, plus their company/role metadata.
+
+    Args:
+        summaries_collection: pymongo collection for summarized_posts
+        metadata_collection: pymongo collection for company_metadata
+        records: Decoded NDJSON records
+        content_collection: pymongo collection for cold storage; records with a raw_post
+            have it compressed there and get a fresh excerpt and search text. Records without
+            one keep the exported excerpt and search text, and have no full raw post.
+
+    Returns:
+        Counts of upserted, modified and rejected records
+    """
+    ops = []
+    cold_ops = []
+    roles_by_company = {}
+    rejected = 0
+    for record in records:
+        if not is_valid_summary_record(record):
+            rejected += 1
+            continue
+        fields = {field: record[field] for field in SUMMARY_FIELDS if field in record}
+        if record.get("raw_post") is not None and content_collection is not None:
+            fields["excerpt"] = make_excerpt(record["raw_post"])
+            fields["search_text"] = make_search_text(record["raw_post"], record["summary"])
+            cold_ops.append(UpdateOne({"url": record["url"]}, {"$set": pack_content(raw_post=record["raw_post"])}, upsert=True))
+        ops.append(UpdateOne({"url": record["url"]}, {"$set": fields}, upsert=True))
+        roles_by_company.setdefault(record["company"], set()).add(record["role"])
+
+    if not ops:
+        return {"upserted": 0, "modified": 0, "rejected": rejected}
+
+    if cold_ops:
+        content_collection.bulk_write(cold_ops, ordered=False)
+    result = summaries_collection.bulk_write(ops, ordered=False)
+    metadata_collection.bulk_write([
+        UpdateOne({"company": company}, {"$addToSet": {"roles": {"$each": sorted(roles)}}}, upsert=True)
+        for company, roles in roles_by_company.items()
+    ], ordered=False)
+    return {"upserted": result.upserted_count, "modified": result.modified_count, "rejected": rejected}
+
+
+def import_ndjson_file(path: str, summaries_collection, metadata_collection, content_collection=None,
+                       batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """
+    Streams an NDJSON export (plain or .gz) from disk into the bulk upsert path.
+    """
+    totals = {"upserted": 0, "modified": 0, "rejected": 0}
+    decoder = NDJSONDecoder(compressed=path.endswith(".gz"))
+    batch = []
+
+    def flush():
+        counts = bulk_upsert_summaries(summaries_collection, metadata_collection, batch, content_collection)
+        for key in totals:
+            totals[key] += counts[key]
+        batch.clear()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            batch.extend(decoder.feed(chunk))
+            if len(batch) >= batch_size:
+                flush()
+    batch.extend(decoder.close())
+    if batch:
+        flush()
+    return totals
@@ -0,0 +1,103 @@
+"""
+Compressed "cold" storage for the bulky parts of a post.
+
+Search documents (summarized_posts) and ingest bookkeeping (posts) stay small;
+the raw post text and the full Reddit payload with its comments live in the
+post_content collection, keyed by url, and are only read for detail views or
+reprocessing.
+"""
+import json
+import os
+import re
+import zlib
+from typing import List, Optional
+
+from bson.binary import Binary
+
+COLD_COLLECTION = "post_content"
+CODEC = "zlib"
+EXCERPT_LENGTH = 280
+# Upper bound on the raw-text search terms kept on a hot document; terms past it are not searchable
+SEARCH_TEXT_LENGTH = int(os.getenv("SEARCH_TEXT_LENGTH", "1000"))
+SEARCH_TERM_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*")
+SEARCH_STOPWORDS = frozenset("""
+a an and are as at be been but by for from had has have he her his i if in into is it its me my not
+of on or our she so than that the their them then there they this to was we were what when which who
+will with you your also about after all any can did do just more other out some very would could
+""".split())
+
+
+def compress_text(text: str) -> Binary:
+    return Binary(zlib.compress(text.encode("utf-8"), 6))
+
+
+def decompress_text(data: Optional[bytes], codec: str = CODEC) -> Optional[str]:
+    if data is None:
+        return None
+    if codec != CODEC:
+        raise ValueError(f"Unsupported cold storage codec: {codec}")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def make_excerpt(raw_post: Optional[str]) -> str:
+    """
+    The short preview kept on the hot search document.
+    """
+    raw_post = (raw_post or "").strip()
+    if len(raw_post) <= EXCERPT_LENGTH:
+        return raw_post
+    return raw_post[:EXCERPT_LENGTH].rstrip() + "…"
+
+
+def search_terms(text: Optional[str]) -> List[str]:
+    """
+    Lowercase terms of a text in first-seen order, without duplicates or stopwords.
+    """
+    return list(dict.fromkeys(t for t in SEARCH_TERM_PATTERN.findall((text or "").lower()) if t not in SEARCH_STOPWORDS))
+
+
+def make_search_text(raw_post: Optional[str], summary: Optional[str] = None) -> str:
+    """
+    The compact searchable form of the raw post kept on the hot search document: its distinct
+    terms, minus those the summary already contains, space-joined and cut at SEARCH_TEXT_LENGTH.
+    Word order and repeats are not kept, so /search matches raw text term by term, not as a phrase.
+    """
+    covered = set(search_terms(summary))
+    text = " ".join(t for t in search_terms(raw_post) if t not in covered)
+    if len(text) <= SEARCH_TEXT_LENGTH:
+        return text
+    return text[:SEARCH_TEXT_LENGTH].rsplit(" ", 1)[0]
+
+
+def pack_content(raw_post: Optional[str] = None, payload: Optional[dict] = None) -> dict:
+    """
+    Builds the $set fields for a post_content document. Only the parts that are given are written.
+    """
+    fields = {"codec": CODEC}
+    if raw_post is not None:
+        fields["raw_post"] = compress_text(raw_post)
+    if payload is not None:
+        fields["payload"] = compress_text(json.dumps(payload, ensure_ascii=False))
+    return fields
+
+
+def unpack_content(doc: Optional[dict]) -> dict:
+    """
+    Decompresses a raw post_content document into {"raw_post": str | None, "payload": dict | None}.
+    """
+    if not doc:
+        return {"raw_post": None, "payload": None}
+    codec = doc.get("codec", CODEC)
+    payload = decompress_text(doc.get("payload"), codec)
+    return {
+        "raw_post": decompress_text(doc.get("raw_post"), codec),
+        "payload": json.loads(payload) if payload is not None else None,
+    }
+
+
+def store_content(collection, url: str, raw_post: Optional[str] = None, payload: Optional[dict] = None) -> None:
+    collection.update_one({"url": url}, {"$set": pack_content(raw_post, payload)}, upsert=True)
+
+
+def load_content(collection, url: str) -> dict:
+    return unpack_content(collection.find_one({"url": url}))
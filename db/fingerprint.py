@@ -0,0 +1,57 @@
+"""
+Content fingerprints for Reddit posts.
+
+A fingerprint only covers what the summarizer actually reads: the post URL, the
+normalized title + selftext and the bodies of the top comments. Volatile fields
+such as scores, num_comments, authors or comment ordering are left out, so a vote
+change does not trigger another (paid) summary.
+
+Fingerprints are prefixed with their scheme version ("v1:<sha256>"). Bump
+FINGERPRINT_VERSION whenever the normalization changes and run
+backend.reddit_collector.rehash_fingerprints to migrate stored hashes.
+"""
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Iterable, Optional
+
+FINGERPRINT_VERSION = 1
+MAX_COMMENTS = 3  # the summary prompt only sees the top 3 comments
+_IGNORED_BODIES = {"", "[deleted]", "[removed]"}
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    text = unicodedata.normalize("NFKC", text or "")
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def content_fingerprint(url: str, text: str, comment_bodies: Iterable[str]) -> str:
+    """
+    Hashes a post's summary-relevant content.
+
+    Args:
+        url: Post URL, which keeps fingerprints unique per post
+        text: Title and selftext (or the stored raw post)
+        comment_bodies: Bodies of the top comments, in any order
+    """
+    bodies = sorted(b for b in (normalize_text(body) for body in comment_bodies) if b not in _IGNORED_BODIES)
+    canonical = json.dumps([url or "", normalize_text(text), bodies], ensure_ascii=False, separators=(",", ":"))
+    return f"v{FINGERPRINT_VERSION}:" + hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def fingerprint_post(post_data: dict) -> str:
+    """
+    Fingerprints a collector post dict, or a stored summary entry that only has "raw".
+    """
+    if "title" in post_data or "selftext" in post_data:
+        text = post_data.get("title", "") + "\n\n" + post_data.get("selftext", "")
+    else:
+        text = post_data.get("raw", "")
+    comments = post_data.get("comments") or []
+    return content_fingerprint(post_data.get("url", ""), text, [c.get("body", "") for c in comments[:MAX_COMMENTS]])
+
+
+def is_current_fingerprint(value: Optional[str]) -> bool:
+    return bool(value) and value.startswith(f"v{FINGERPRINT_VERSION}:")
@@ -1,69 +1,138 @@
-from mongoengine import connect, Document, StringField, DictField, BooleanField, ListField, IntField
+from mongoengine import connect, Document, StringField, BooleanField, ListField, IntField, BinaryField
 import logging 
 import os
+from typing import Optional
+from db.fingerprint import fingerprint_post, is_current_fingerprint
+from db.cold_storage import COLD_COLLECTION, CODEC, make_excerpt, make_search_text, store_content, load_content
 from dotenv import load_dotenv
 load_dotenv()
 # Connect to local MongoDB
 connect(host=os.getenv("COSMODB_CONNSTR"), db="reddit-interview", tls=True)
 
+class PostContent(Document):
+    """
+    Cold, compressed raw text and Reddit payload (with comments) for a post, keyed by url.
+    """
+    url = StringField(required=True, unique=True)
+    raw_post = BinaryField()
+    payload = BinaryField()
+    codec = StringField(default=CODEC)
+
+    meta = {
+        'collection': COLD_COLLECTION,
+        'indexes': [
+            {'fields': ['url'], 'unique': True}
+        ]
+    }
+
+    @classmethod
+    def store(cls, url: str, raw_post: Optional[str] = None, payload: Optional[dict] = None) -> None:
+        store_content(cls._get_collection(), url, raw_post, payload)
+
+    @classmethod
+    def load(cls, url: str) -> dict:
+        return load_content(cls._get_collection(), url)
+
+    @classmethod
+    def discard_summary_content(cls, url: str) -> None:
+        """
+        Called when a SummarizedPost is deleted: drops the raw text, and the whole row
+        unless a Post still needs its payload.
+        """
+        if Post.objects(url=url).first():
+            cls._get_collection().update_one({"url": url}, {"$unset": {"raw_post": ""}})
+        else:
+            cls.objects(url=url).delete()
+
+
 class Post(Document):
     url = StringField(required=True, unique=True)
-    payload = DictField(required=True)
     hash = StringField(required=True, unique=True)  # unique hash
     meta = {
         'collection': 'posts',
         'indexes': [
             {'fields': ['url'], 'unique': True}  # enforce unique URL
         ],
-        'allow_inheritance': True
+        'allow_inheritance': True,
+        'strict': False  # rows not yet moved to cold storage still carry a payload
     }
     processed = BooleanField(default=False)
 
+    @property
+    def payload(self) -> Optional[dict]:
+        return PostContent.load(self.url)["payload"] or self._data.get("payload")
+
     @classmethod
     def upsert_post(cls, input_url: str, payload: dict, new_hash: str) -> bool:
         logging.info(f"Upserting post with URL: {input_url} and hash: {new_hash}")
         try:
             existing = cls.objects(url=input_url).first()
             if existing:
+                if existing.hash != new_hash and not is_current_fingerprint(existing.hash) and fingerprint_post(existing.payload or {}) == new_hash:
+                    # Hashed under an older fingerprint scheme but the content is unchanged
+                    existing.update(set__hash=new_hash)
+                    print(f"Post unchanged, refreshed fingerprint: {input_url}")
+                    return False
                 if existing.hash != new_hash:
+                    PostContent.store(input_url, payload=payload)
                     existing.hash = new_hash
-                    existing.payload = payload
                     existing.save()
                     print(f"Replaced existing post with new hash: {input_url}")
                 else:
                     print(f"Post already exists with same hash: {input_url}")
                     return False
             else:
-                cls(url=input_url, hash=new_hash, payload=payload).save()
+                PostContent.store(input_url, payload=payload)
+                cls(url=input_url, hash=new_hash).save()
                 print(f"Inserted new post: {input_url}")
         except Exception as e:
             logging.error(f"Caught an exception: {e}")
         return True
 
 class SummarizedPost(Document):
+    """
+    Hot search document. The full raw post lives in PostContent.
+    """
     url = StringField(required=True, unique=True)
     hash = StringField(required=True)
     company = StringField(required=True)
     role = StringField(required=True)
     summary = StringField(required=True)
-    raw_post = StringField(required=True)
-    payload = DictField(required=False)
+    excerpt = StringField(default="")
+    search_text = StringField(default="")  # distinct raw-text terms not in the summary, for /search
     timestamp = IntField(required=True)
     
     meta = {
         'collection': 'summarized_posts',
         'indexes': [
             {'fields': ['url'], 'unique': True}
-        ]
+        ],
+        'strict': False  # rows not yet moved to cold storage still carry raw_post/payload
     }
 
+    @property
+    def raw_post(self) -> Optional[str]:
+        return PostContent.load(self.url)["raw_post"] or self._data.get("raw_post")
     @classmethod
     def upsert_post(cls, url: str, summary: str, raw_post: str, new_hash: str, role: str, company: str, timestamp: int) -> None:
         existing = cls.objects(url=url).first()
         if existing:
+            if existing.hash != new_hash and not is_current_fingerprint(existing.hash):
+                # Only rows hashed under an older fingerprint scheme need their stored content read back
+                content = PostContent.load(url)
+                raw = content["raw_post"] or existing._data.get("raw_post")
+                comments = (content["payload"] or existing._data.get("payload") or {}).get("comments", [])
+                if fingerprint_post({"url": url, "raw": raw, "comments": comments}) == new_hash:
+                    # The content is unchanged
+                    existing.update(set__hash=new_hash)
+                    print(f"Summarized post unchanged, refreshed fingerprint: {url}")
+                    return False
             if existing.hash != new_hash:
+                PostContent.store(url, raw_post=raw_post)
                 existing.hash = new_hash
                 existing.summary = summary
+                existing.excerpt = make_excerpt(raw_post)
+                existing.search_text = make_search_text(raw_post, summary)
                 existing.save()
                 print(f"Replaced existing summarized post with new hash: {url}")
             else:
@@ -71,7 +140,8 @@ class SummarizedPost(Document):
                 return False
         else:
             logging.info(f"Upserting summarized post with URL: {url} and hash: {new_hash}")
-            cls(url=url, hash=new_hash, summary=summary, raw_post=raw_post, role=role, company=company, timestamp=timestamp).save()
+            PostContent.store(url, raw_post=raw_post)
+            cls(url=url, hash=new_hash, summary=summary, excerpt=make_excerpt(raw_post), search_text=make_search_text(raw_post, summary), role=role, company=company, timestamp=timestamp).save()
             print(f"Inserted new summarized post: {url}")
         return True
 class CompanyMetadata(Document):
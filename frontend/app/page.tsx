@@ -30,6 +30,7 @@ import {
 // Types
 // ---------------------------------------------
 interface InterviewPost {
+  id: string;
   raw: string;
   summary: string;
   url: string;
@@ -232,7 +233,8 @@ export default function InterviewSearchPage() {
       const data = await res.json();
       // 🔑 Parse raw backend results into what the frontend expects
       const posts: InterviewPost[] = (data.results ?? []).map((item: any) => ({
-        raw: item.raw_post ?? "",
+        id: item._id ?? "",
+        raw: item.excerpt ?? item.raw_post ?? "",
         summary: item.summary ?? "",
         url: item.url ?? "#",
         company: item.company ?? "Unknown",
@@ -281,8 +283,43 @@ export default function InterviewSearchPage() {
   const [expandedPosts, setExpandedPosts] = useState<Record<number, boolean>>(
     {}
   );
-  const toggleExpand = (index: number) =>
+  // Full post text is kept in cold storage server-side; fetch it on first expand
+  const [fullPosts, setFullPosts] = useState<Record<string, string>>({});
+
+  const fetchFullPost = async (id: string) => {
+    try {
+      const tokenResp = await fetch(
+        process.env.NEXT_PUBLIC_BACKEND_API_ENDPOINT! + "/token",
+        {
+          method: "GET",
+          headers: { "Content-Type": "application/json" },
+        }
+      );
+      if (!tokenResp.ok) {
+        throw new Error(`Token fetch failed: ${tokenResp.status}`);
+      }
+      const { token } = await tokenResp.json();
+      const res = await fetch(
+        process.env.NEXT_PUBLIC_BACKEND_API_ENDPOINT! + `/posts/${id}`,
+        {
+          method: "GET",
+          headers: { Authorization: `Bearer ${token}` },
+        }
+      );
+      if (!res.ok) throw new Error(`Error: ${res.status}`);
+      const data = await res.json();
+      setFullPosts((prev) => ({ ...prev, [id]: data.raw_post ?? "" }));
+    } catch (err) {
+      console.error("Failed to fetch full post", err);
+    }
+  };
+
+  const toggleExpand = (index: number, post: InterviewPost) => {
+    if (!expandedPosts[index] && post.id && !(post.id in fullPosts)) {
+      fetchFullPost(post.id);
+    }
     setExpandedPosts((prev) => ({ ...prev, [index]: !prev[index] }));
+  };
 
   return (
     <>
@@ -574,7 +611,7 @@ export default function InterviewSearchPage() {
                             <Button
                               variant="outline"
                               size="sm"
-                              onClick={() => toggleExpand(globalIndex)}
+                              onClick={() => toggleExpand(globalIndex, post)}
                               className="mb-2"
                             >
                               {expandedPosts[globalIndex]
@@ -586,7 +623,13 @@ export default function InterviewSearchPage() {
                                 expandedPosts[globalIndex] ? "" : "line-clamp-3"
                               }`}
                             >
-                              <BoldText text={post.raw} />
+                              <BoldText
+                                text={
+                                  expandedPosts[globalIndex]
+                                    ? fullPosts[post.id] ?? post.raw
+                                    : post.raw
+                                }
+                              />
                             </p>
                           </div>
                         </div>
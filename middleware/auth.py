@@ -8,6 +8,7 @@ from starlette.middleware.base import BaseHTTPMiddleware
 load_dotenv()
 
 SECRET = os.getenv("HMAC_SECRET")  # store in env, not in code
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")  # guards write endpoints such as /import
 TTL = 60  # 60 seconds
     
 def make_ephemeral_token(TTL: int = TTL) -> str:
@@ -50,4 +51,11 @@ def get_token_from_header(request: Request):
     auth = request.headers.get("Authorization")
     if not auth or not auth.startswith("Bearer "):
         raise HTTPException(401, "Missing token")
-    return auth.split(" ")[1]
\ No newline at end of file
+    return auth.split(" ")[1]
+
+def verify_admin_key(request: Request):
+    if not ADMIN_API_KEY:
+        raise HTTPException(403, "Admin endpoints are disabled")
+    key = request.headers.get("X-Admin-Key", "")
+    if not hmac.compare_digest(key.encode(), ADMIN_API_KEY.encode()):
+        raise HTTPException(401, "Invalid admin key")